@@ -3,12 +3,72 @@ import numpy as np
 import pandas as pd
 import pickle
 import io
+import os
+import csv
+import time
 import random
+import hashlib
+import threading
+from functools import partial
+from datetime import datetime
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 # Load your trained model
 with open("Diabetesmodel.pkl", "rb") as f:
     model = pickle.load(f)
 
+# Shadow / A/B evaluation settings
+# Drop a candidate model next to the primary one to score it in the background.
+CANDIDATE_MODEL_PATH = "Candidatemodel.pkl"
+SHADOW_LOG_PATH = "shadow_log.csv"
+SHADOW_LOG_COLUMNS = ["timestamp", "candidate_id", "served", "primary_proba", "candidate_proba",
+                      "delta", "agree", "primary_ms", "candidate_ms"]
+SHADOW_LOG_MAX_BYTES = 5 * 1024 * 1024  # rotate the log once it grows past this size
+SHADOW_MAX_PENDING = 32  # comparisons queued beyond this are dropped, not buffered
+SHADOW_LATENCY_WINDOW = 1000  # recent latencies kept per model for the summary
+
+# % of sessions served by the candidate (0 = shadow only), set via the AB_SPLIT_PERCENT env var
+try:
+    AB_SPLIT_PERCENT = min(max(float(os.environ.get("AB_SPLIT_PERCENT", 0)), 0.0), 100.0)
+except ValueError:
+    AB_SPLIT_PERCENT = 0.0
+
+# Candidate Loader (cached per file version, so reruns don't re-read or re-unpickle it)
+@st.cache_resource(show_spinner=False, max_entries=1)
+def load_candidate(path, mtime, size):
+    try:
+        with open(path, "rb") as f:
+            candidate_bytes = f.read()
+        model_id = hashlib.sha256(candidate_bytes).hexdigest()[:12]
+        clf = pickle.loads(candidate_bytes)
+    except Exception as e:
+        return None, None, f"Candidate model could not be loaded: {e}"
+
+    expected_features = getattr(model, "n_features_in_", 4)
+    if not callable(getattr(clf, "predict_proba", None)):
+        return None, model_id, "Candidate model has no predict_proba method; shadow evaluation disabled."
+    if getattr(clf, "n_features_in_", None) != expected_features:
+        return None, model_id, (f"Candidate model expects {getattr(clf, 'n_features_in_', 'unknown')} "
+                                f"features, primary uses {expected_features}; shadow evaluation disabled.")
+    if not np.array_equal(getattr(clf, "classes_", []), model.classes_):
+        return None, model_id, (f"Candidate model classes {np.asarray(getattr(clf, 'classes_', [])).tolist()} do not match "
+                                f"primary classes {np.asarray(model.classes_).tolist()}; shadow evaluation disabled.")
+    return clf, model_id, None
+
+candidate_model = None
+candidate_id = None
+candidate_warning = None
+try:
+    candidate_stat = os.stat(CANDIDATE_MODEL_PATH)
+except FileNotFoundError:
+    pass
+except OSError as e:
+    candidate_warning = f"Candidate model could not be loaded: {e}"
+else:
+    candidate_model, candidate_id, candidate_warning = load_candidate(
+        CANDIDATE_MODEL_PATH, candidate_stat.st_mtime, candidate_stat.st_size)
+
 # Health tips quotes
 quotes = [
     "“Take care of your body. It’s the only place you have to live.” – Jim Rohn",
@@ -89,6 +149,11 @@ if "history" not in st.session_state:
     st.session_state.history = []
 if "last_prediction" not in st.session_state:
     st.session_state.last_prediction = False
+if st.session_state.get("ab_candidate_id") != candidate_id:
+    # A/B arm is drawn once per session (and again only if the candidate changes)
+    st.session_state.ab_candidate_id = candidate_id
+    st.session_state.ab_arm = ("candidate" if candidate_model is not None
+                               and random.uniform(0, 100) < AB_SPLIT_PERCENT else "primary")
 
 # Risk Summary Generator
 def generate_risk_summary(glucose, bp, bmi, age, risk):
@@ -105,6 +170,143 @@ def generate_risk_summary(glucose, bp, bmi, age, risk):
         advice.append("• Your inputs are within healthy ranges. Keep up the good lifestyle!")
     return f"### Overall Risk Level: {risk}\n\n" + "\n".join(advice) + "\n\nPlease consult your healthcare provider for tailored advice."
 
+# Timed Prediction
+def predict_with_latency(clf, features):
+    start = time.perf_counter()
+    proba = clf.predict_proba(features)[0][1] * 100
+    return proba, (time.perf_counter() - start) * 1000
+
+# Running agreement/latency totals for one candidate, kept in memory so the sidebar never parses the log
+def new_shadow_aggregate():
+    return {
+        "n": 0,
+        "agree": 0,
+        "abs_delta": 0.0,
+        "arms": {arm: {"n": 0, "agree": 0, "abs_delta": 0.0} for arm in ("primary", "candidate")},
+        "latency": {name: deque(maxlen=SHADOW_LATENCY_WINDOW) for name in ("primary", "candidate")},
+    }
+
+# Folds one comparison into the running totals (caller holds the lock)
+def update_shadow_aggregates(state, model_id, served, delta, agree, primary_ms, candidate_ms):
+    agg = state["aggregates"].setdefault(model_id, new_shadow_aggregate())
+    for bucket in (agg, agg["arms"][served]):
+        bucket["n"] += 1
+        bucket["agree"] += agree
+        bucket["abs_delta"] += abs(delta)
+    agg["latency"]["primary"].append(primary_ms)
+    agg["latency"]["candidate"].append(candidate_ms)
+
+# Moves the current log aside as shadow_log.<timestamp>.csv (caller holds the lock)
+def rotate_shadow_log():
+    root, ext = os.path.splitext(SHADOW_LOG_PATH)
+    os.replace(SHADOW_LOG_PATH, f"{root}.{datetime.now().strftime('%Y%m%d%H%M%S')}{ext}")
+
+# Rotates the log if it has an outdated header or has grown past the size cap (caller holds the lock)
+def rotate_shadow_log_if_needed():
+    if not os.path.exists(SHADOW_LOG_PATH):
+        return
+    with open(SHADOW_LOG_PATH, newline="") as f:
+        header = next(csv.reader(f), None)
+    if header != SHADOW_LOG_COLUMNS or os.path.getsize(SHADOW_LOG_PATH) > SHADOW_LOG_MAX_BYTES:
+        rotate_shadow_log()
+
+# Background worker, log lock, counters and running totals shared across reruns,
+# so shadow scoring never blocks the user. Totals are seeded once from the current log.
+@st.cache_resource(show_spinner=False)
+def get_shadow_state():
+    state = {
+        "worker": ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow"),
+        "lock": threading.Lock(),
+        "slots": threading.BoundedSemaphore(SHADOW_MAX_PENDING),
+        "failure_count": 0,
+        "last_failure": None,
+        "dropped_count": 0,
+        "aggregates": {},
+    }
+    try:
+        rotate_shadow_log_if_needed()
+        if os.path.exists(SHADOW_LOG_PATH):
+            df = pd.read_csv(SHADOW_LOG_PATH, dtype={"candidate_id": str}).dropna()
+            for row in df.itertuples(index=False):
+                update_shadow_aggregates(state, row.candidate_id, row.served, row.delta,
+                                         int(row.agree), row.primary_ms, row.candidate_ms)
+    except (OSError, KeyError, ValueError, pd.errors.ParserError, pd.errors.EmptyDataError) as e:
+        record_shadow_error(state, e)
+    return state
+
+# Records a shadow-path exception so it shows up in the sidebar
+def record_shadow_error(state, error):
+    with state["lock"]:
+        state["failure_count"] += 1
+        state["last_failure"] = (f"{datetime.now().isoformat(timespec='seconds')} "
+                                 f"{type(error).__name__}: {error}")
+
+# Shadow Comparison Logger (runs on the background worker)
+# Both models are timed here, on the same thread, so their latencies are comparable.
+def log_shadow_comparison(state, features, served, primary_clf, candidate_clf, model_id, threshold):
+    primary_proba, primary_ms = predict_with_latency(primary_clf, features)
+    candidate_proba, candidate_ms = predict_with_latency(candidate_clf, features)
+    delta = candidate_proba - primary_proba
+    agree = int((primary_proba >= threshold) == (candidate_proba >= threshold))
+
+    with state["lock"]:
+        rotate_shadow_log_if_needed()
+        new_file = not os.path.exists(SHADOW_LOG_PATH)
+        with open(SHADOW_LOG_PATH, "a", newline="") as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(SHADOW_LOG_COLUMNS)
+            writer.writerow([datetime.now().isoformat(timespec="seconds"), model_id, served,
+                             f"{primary_proba:.2f}", f"{candidate_proba:.2f}", f"{delta:.2f}", agree,
+                             f"{primary_ms:.3f}", f"{candidate_ms:.3f}"])
+        update_shadow_aggregates(state, model_id, served, delta, agree, primary_ms, candidate_ms)
+
+# Frees the backlog slot and records any exception raised on the background worker
+def record_shadow_failure(state, future):
+    state["slots"].release()
+    error = future.exception()
+    if error is not None:
+        record_shadow_error(state, error)
+
+# Queues a shadow comparison, dropping it if the backlog is full
+def submit_shadow_comparison(state, *args):
+    if not state["slots"].acquire(blocking=False):
+        with state["lock"]:
+            state["dropped_count"] += 1
+        return
+    future = state["worker"].submit(log_shadow_comparison, state, *args)
+    future.add_done_callback(partial(record_shadow_failure, state))
+
+# Shadow Summary Report (current candidate only)
+def generate_shadow_summary(state, model_id):
+    with state["lock"]:
+        agg = state["aggregates"].get(model_id)
+        if agg is None or agg["n"] == 0:
+            return None, None, None
+        totals = {"n": agg["n"], "agree": agg["agree"], "abs_delta": agg["abs_delta"]}
+        arms = {arm: dict(stats) for arm, stats in agg["arms"].items()}
+        latency = {name: list(values) for name, values in agg["latency"].items()}
+
+    agreement_rows = []
+    for arm, stats in arms.items():
+        agreement_rows.append({
+            "Served Arm": arm.title(),
+            "Comparisons": stats["n"],
+            "Agreement Rate": f"{stats['agree'] / stats['n'] * 100:.1f}%" if stats["n"] else "–",
+            "Mean |Δ Proba|": f"{stats['abs_delta'] / stats['n']:.2f}" if stats["n"] else "–",
+        })
+
+    primary_latency = np.mean(latency["primary"])
+    latency_rows = []
+    for name, values in latency.items():
+        latency_rows.append({
+            "Model": name.title(),
+            "Mean Latency (ms)": round(float(np.mean(values)), 3),
+            "P95 Latency (ms)": round(float(np.percentile(values, 95)), 3),
+            "Overhead vs Primary (ms)": round(float(np.mean(values) - primary_latency), 3),
+        })
+    return totals, pd.DataFrame(agreement_rows), pd.DataFrame(latency_rows)
+
 # Title
 st.title("🩺 AI Diabetes Risk Assessment")
 
@@ -119,6 +321,30 @@ with st.sidebar:
     _These are general health ranges._
     """)
 
+    if candidate_warning:
+        st.warning(candidate_warning)
+
+    if candidate_model is not None:
+        with st.expander("🧪 Shadow Evaluation"):
+            st.caption(f"Candidate `{candidate_id}` serves {AB_SPLIT_PERCENT:g}% of sessions. "
+                       "Both models are re-scored and timed on the background worker for comparison; "
+                       f"latency covers the last {SHADOW_LATENCY_WINDOW} comparisons.")
+            shadow_state = get_shadow_state()
+            if shadow_state["failure_count"]:
+                st.error(f"{shadow_state['failure_count']} shadow comparison(s) failed. "
+                         f"Latest: {shadow_state['last_failure']}")
+            if shadow_state["dropped_count"]:
+                st.warning(f"{shadow_state['dropped_count']} shadow comparison(s) dropped because the "
+                           f"background queue was full ({SHADOW_MAX_PENDING} pending).")
+            shadow_totals, shadow_agreement, shadow_latency = generate_shadow_summary(shadow_state, candidate_id)
+            if shadow_totals is not None:
+                st.metric("Overall Agreement", f"{shadow_totals['agree'] / shadow_totals['n'] * 100:.1f}%")
+                st.metric("Disagreements", f"{shadow_totals['n'] - shadow_totals['agree']} / {shadow_totals['n']}")
+                st.dataframe(shadow_agreement, hide_index=True)
+                st.dataframe(shadow_latency, hide_index=True)
+            else:
+                st.info("No shadow comparisons logged yet.")
+
 # Tabs
 tab_input, tab_info, tab_history, tab_tips = st.tabs(["📥 Input", "📖 Info", "📊 History", "💡 Health Tips"])
 
@@ -189,9 +415,24 @@ with tab_input:
                 st.error(err)
         else:
             features = np.array([[glucose, blood_pressure, bmi, age]])
-            proba = model.predict_proba(features)[0][1] * 100
+            served = st.session_state.ab_arm if candidate_model is not None else "primary"
+            served_model = candidate_model if served == "candidate" else model
+            model_label = f"Candidate ({candidate_id})" if served == "candidate" else "Primary"
+
+            try:
+                proba = served_model.predict_proba(features)[0][1] * 100
+            except Exception as e:
+                # A failing candidate must never reach the user: fall back to the primary model
+                record_shadow_error(get_shadow_state(), e)
+                served = "primary"
+                model_label = "Primary (candidate fallback)"
+                proba = model.predict_proba(features)[0][1] * 100
             prediction = 1 if proba >= threshold else 0
 
+            if candidate_model is not None:
+                submit_shadow_comparison(get_shadow_state(), features, served, model,
+                                         candidate_model, candidate_id, threshold)
+
             if proba < 30:
                 risk = "Low"
             elif proba < 70:
@@ -216,7 +457,8 @@ with tab_input:
                 "Prediction": "Likely" if prediction == 1 else "Not Likely",
                 "Confidence": f"{proba:.2f}%",
                 "Threshold": f"{threshold}%",
-                "Risk Level": risk
+                "Risk Level": risk,
+                "Model": model_label
             })
 
             report = f"""AI Diabetes Risk Report
@@ -230,6 +472,7 @@ Decision Threshold: {threshold}%
 Prediction: {"Likely" if prediction == 1 else "Not Likely"}
 Confidence: {proba:.2f}%
 Risk Level: {risk}
+Model: {model_label}
 
 Advice:
 {summary.replace('### Overall Risk Level: ' + risk, '').strip()}